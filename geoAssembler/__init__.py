@@ -40,5 +40,18 @@ Author: bergeman
 __version__ = "0.8.0"
 
 
-from .nb.notebook import MainWidget as CalibrateNb
 from .calibrants import calibrants
+
+
+def __getattr__(name):
+    """Import the notebook widget on first access.
+
+    It pulls in matplotlib and ipywidgets, which the command line script
+    doesn't need for creating notebooks or starting the Qt GUI.
+    """
+    if name == 'CalibrateNb':
+        from .nb.notebook import MainWidget as CalibrateNb
+        globals()['CalibrateNb'] = CalibrateNb
+        return CalibrateNb
+    raise AttributeError('module {!r} has no attribute {!r}'
+                         .format(__name__, name))
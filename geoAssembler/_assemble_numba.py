@@ -0,0 +1,55 @@
+"""Compiled tile copying for position_all_modules, used if numba is available."""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    HAVE_NUMBA = False
+else:
+    HAVE_NUMBA = True
+
+
+def plan_table(plan, data_shape):
+    """Convert an assembly plan into an integer table for :func:`assemble`.
+
+    Parameters:
+        plan (list): (src, dst, transpose) tuples from the geometry
+        data_shape (tuple): shape (channelno, pixel_ss, pixel_fs) of the data
+
+    Returns:
+        int array with one row per tile: module number, ss start, ss step,
+        number of ss pixels, fs start, fs step, number of fs pixels,
+        y and x of the tile on the canvas and whether to transpose it
+    """
+    table = np.empty((len(plan), 10), dtype=np.int64)
+    for row, (src, dst, transpose) in zip(table, plan):
+        _, modno, ss_slice, fs_slice = src
+        ss = range(*ss_slice.indices(data_shape[-2]))
+        fs = range(*fs_slice.indices(data_shape[-1]))
+        row[:] = (modno, ss.start, ss.step, len(ss), fs.start, fs.step,
+                  len(fs), dst[-2].start, dst[-1].start, transpose)
+    return table
+
+
+if HAVE_NUMBA:
+    @njit(parallel=True, cache=True)
+    def assemble(data, out, table):
+        """Copy all tiles of data (frames, modules, ss, fs) onto out.
+
+        out has the shape (frames, y, x), table comes from :func:`plan_table`.
+        """
+        n_tiles = table.shape[0]
+        for k in prange(data.shape[0] * n_tiles):
+            frame, t = divmod(k, n_tiles)
+            modno, ss0, ss_step, h = table[t, 0], table[t, 1], table[t, 2], table[t, 3]
+            fs0, fs_step, w = table[t, 4], table[t, 5], table[t, 6]
+            y0, x0, transpose = table[t, 7], table[t, 8], table[t, 9]
+            for i in range(h):
+                ss = ss0 + i * ss_step
+                for j in range(w):
+                    value = data[frame, modno, ss, fs0 + j * fs_step]
+                    if transpose:
+                        out[frame, y0 + j, x0 + i] = value
+                    else:
+                        out[frame, y0 + i, x0 + j] = value
@@ -7,9 +7,16 @@ from extra_geom import (
     AGIPD_1MGeometry, DSSC_1MGeometry, LPD_1MGeometry,
 )
 from extra_geom.detectors import GeometryFragment
+import h5py
 import numpy as np
 import pandas as pd
 
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+from . import _assemble_numba
 from .defaults import DefaultGeometryConfig as Defaults
 
 log = logging.getLogger(__name__)
@@ -30,6 +37,33 @@ def _move_mod(module, inc):
             ) for tile in module]
 
 
+def _tile_corners(modules):
+    """Get the xy corners of all tiles as one array.
+
+    Parameters:
+        modules (list): List of modules containing Geometry Fragments
+
+    Returns:
+        ndarray of shape (n_modules, n_tiles, 4, 2)
+    """
+    tiles = [tile for module in modules for tile in module]
+    corner_pos = np.array([tile.corner_pos[:2] for tile in tiles])
+    ss = np.array([tile.ss_vec[:2] * tile.ss_pixels for tile in tiles])
+    fs = np.array([tile.fs_vec[:2] * tile.fs_pixels for tile in tiles])
+    corners = np.stack([corner_pos,
+                        corner_pos + fs,
+                        corner_pos + ss + fs,
+                        corner_pos + ss], axis=1)
+    return corners.reshape(len(modules), -1, 4, 2)
+
+
+def _tile_slice(start, length, step):
+    """Slice length pixels from start, in reverse order if step is negative."""
+    if step > 0:
+        return slice(start, start + length)
+    return slice(start + length - 1, start - 1 if start else None, -1)
+
+
 class GeometryAssembler:
     """Base class for geometry methods not part of extra_geom.
 
@@ -51,6 +85,28 @@ class GeometryAssembler:
         # Store quadrant shifts as integer numbers of pixels, and convert to
         # metres when we apply them, to avoid accumulating floating point error.
         self.quad_offsets = np.zeros((4, 2), dtype=np.int32)
+        # Per module offsets in metres, reused while moving quadrants
+        self._offset_scratch = np.empty((16, 2), dtype=np.float64)
+        # Tile corners and tiles of the unmoved geometry, see _current_corners
+        # and _orig_tiles
+        self._orig_corners = None
+        self._orig_tiles_cache = None
+        # Snapped tile positions as arrays, see _snapped_tiles
+        self._tiles_cache = None
+        # Quadrant bounding boxes in snapped pixel coordinates by quadrant
+        self._quad_bounds_cache = {}
+        # Tile copy instructions for the last used canvas (canvas, plan)
+        self._plan_cache = (None, None)
+        # Canvas pixels not covered by any tile for the last canvas
+        self._gaps_cache = (None, None)
+        # The same gap mask uploaded to the GPU for position_all_modules_cupy
+        self._gaps_gpu_cache = (None, None)
+        # Assembly plan as an integer table for the compiled kernel
+        self._plan_table_cache = (None, None)
+        # Offsets read from the HDF5 geometry file (if any), see _file_offsets
+        self._h5_offsets = None
+        # Last computed quadrant positions, keyed on the quadrant offsets
+        self._quad_pos_cache = (None, None)
 
     @property
     def modules(self):
@@ -66,6 +122,49 @@ class GeometryAssembler:
         """Plot a representation of the current geometry."""
         return self.exgeom_obj.inspect()
 
+    def _get_quad_pos(self):
+        """Calculate the quadrant positions of the current geometry."""
+        raise NotImplementedError
+
+    def _quad_pos_array(self):
+        """Get quadrant positions as a read-only (4, 2) array.
+
+        The positions are only recalculated if the quadrants were moved.
+        """
+        key = self.quad_offsets.tobytes()
+        if self._quad_pos_cache[0] != key:
+            quad_pos = np.asarray(self._get_quad_pos(), dtype=np.float64)
+            # Callers must not modify the cached positions
+            quad_pos.flags.writeable = False
+            self._quad_pos_cache = (key, quad_pos)
+        return self._quad_pos_cache[1]
+
+    @property
+    def quad_pos(self):
+        """Get quadrant positions."""
+        return pd.DataFrame(self._quad_pos_array(), copy=True,
+                            columns=['X', 'Y'],
+                            index=['q{}'.format(i) for i in range(1, 5)])
+
+    def _get_offsets(self, h5file):
+        """Read the offsets of the reference tile of each quadrant.
+
+        Parameters:
+            h5file (h5py.File): open XFEL HDF5 geometry file
+        """
+        raise NotImplementedError
+
+    def _file_offsets(self):
+        """Get module + tile offsets (in mm) stored in the HDF5 geometry file.
+
+        The file is opened only once, the offsets don't change for a given
+        geometry file and are kept for subsequent calls.
+        """
+        if self._h5_offsets is None:
+            with h5py.File(self.filename, 'r') as f:
+                self._h5_offsets = self._get_offsets(f)
+        return self._h5_offsets
+
     def move_quad(self, quad, inc):
         """Move the whole quad in a given direction.
 
@@ -77,11 +176,124 @@ class GeometryAssembler:
 
     def set_quad_offset(self, quad, offset):
         self.quad_offsets[quad - 1] = offset
-        quad_offsets_m = self.quad_offsets * self.pixel_size
-        self.exgeom_obj = self.exgeom_obj_orig.offset(
-            # Repeat each quadrant offset 4 times to get offsets per module
-            np.repeat(quad_offsets_m, repeats=4, axis=0)
-        )
+        # Repeat each quadrant offset 4 times to get offsets per module
+        np.multiply(self.quad_offsets[:, np.newaxis], self.pixel_size,
+                    out=self._offset_scratch.reshape(4, 4, 2))
+        self.exgeom_obj = self.exgeom_obj_orig.offset(self._offset_scratch)
+        self._tiles_cache = None
+        self._quad_bounds_cache = {}
+        self._plan_cache = (None, None)
+        self._gaps_cache = (None, None)
+        self._gaps_gpu_cache = (None, None)
+        self._plan_table_cache = (None, None)
+
+    def _quad_bounds(self, quad):
+        """Get the bounding box of a quad in snapped pixel coordinates.
+
+        The box is only recalculated after the quadrants were moved.
+        """
+        try:
+            return self._quad_bounds_cache[quad]
+        except KeyError:
+            pass
+        modules = Defaults.quad2slice[self.detector_name][quad]
+        tiles = self._snapped_tiles()
+        y, x = tiles['corner_idx'][modules].reshape(-1, 2).T
+        h, w = tiles['pixel_dims'][modules].reshape(-1, 2).T
+        dy = (y + h).max() - y.min()
+        dx = x.max() - x.min()
+        bounds = x.min(), y.min(), dx+w[-1], dy
+        self._quad_bounds_cache[quad] = bounds
+        return bounds
+
+    def _current_corners(self):
+        """Get the xy corners (in metres) of all tiles in the current geometry.
+
+        The corners of the unmoved geometry are only calculated once, the
+        quadrant offsets are added to them.
+
+        Returns:
+            ndarray of shape (n_modules, n_tiles, 4, 2)
+        """
+        if self._orig_corners is None:
+            self._orig_corners = _tile_corners(self.exgeom_obj_orig.modules)
+        # Repeat each quadrant offset 4 times to get offsets per module
+        offsets = np.repeat(self.quad_offsets * self.pixel_size, 4, axis=0)
+        return self._orig_corners + offsets[:, np.newaxis, np.newaxis]
+
+    def _orig_tiles(self):
+        """Get the tiles of the unmoved geometry as a dict of arrays.
+
+        'corner_pos', 'ss_vec' and 'fs_vec' hold xy vectors in metres with
+        the shape (n_modules, n_tiles, 2); 'ss_pixels' and 'fs_pixels' have
+        the shape (n_modules, n_tiles).
+        """
+        if self._orig_tiles_cache is None:
+            modules = self.exgeom_obj_orig.modules
+            tiles = [tile for module in modules for tile in module]
+            shape = (len(modules), -1)
+            self._orig_tiles_cache = {
+                attr: np.array([getattr(tile, attr)[:2] for tile in tiles]
+                               ).reshape(shape + (2,))
+                for attr in ('corner_pos', 'ss_vec', 'fs_vec')
+            }
+            for attr in ('ss_pixels', 'fs_pixels'):
+                self._orig_tiles_cache[attr] = np.array(
+                    [getattr(tile, attr) for tile in tiles]).reshape(shape)
+        return self._orig_tiles_cache
+
+    def _snapped_tiles(self):
+        """Snap all tiles of the current geometry to the pixel grid at once.
+
+        This gives the same layout as the EXtra-geom snapped geometry, but
+        uses array operations on the unmoved tiles plus the quadrant offsets.
+        The returned dict holds (n_modules, n_tiles, 2) arrays of (y, x)
+        pairs: 'corner_idx' and 'pixel_dims' of the tiles in pixels and the
+        'ss_vec' and 'fs_vec' orientations, as well as the detector 'centre'
+        and the 'size_yx' of the assembled image. The layout is only rebuilt
+        after the quadrants were moved.
+        """
+        if self._tiles_cache is not None:
+            return self._tiles_cache
+        orig = self._orig_tiles()
+        px_shape = self.exgeom_obj._pixel_shape
+        # Repeat each quadrant offset 4 times to get offsets per module
+        offsets = np.repeat(self.quad_offsets * self.pixel_size, 4, axis=0)
+        corner_pos = orig['corner_pos'] + offsets[:, np.newaxis]
+        # Round positions and vectors to integers and convert xy to yx
+        corner_pos, ss_vec, fs_vec = (
+            np.around(vec / px_shape).astype(np.int32)[..., ::-1]
+            for vec in (corner_pos, orig['ss_vec'], orig['fs_vec']))
+        # We should have one vector in the x direction and one in y
+        assert (np.abs(ss_vec).sum(axis=-1) == 1).all()
+        assert (np.abs(ss_vec) + np.abs(fs_vec) == 1).all()
+        ss_pixels, fs_pixels = orig['ss_pixels'], orig['fs_pixels']
+        # Fast scan along y is transposed so that fast scan goes along x
+        transposed = (fs_vec[..., 0] != 0)[..., np.newaxis]
+        ss_order = np.where(transposed[..., 0], ss_vec[..., 1], ss_vec[..., 0])
+        fs_order = np.where(transposed[..., 0], fs_vec[..., 0], fs_vec[..., 1])
+        ss_shift = np.minimum(ss_order, 0) * ss_pixels
+        fs_shift = np.minimum(fs_order, 0) * fs_pixels
+        corner_shift = np.where(transposed,
+                                np.stack([fs_shift, ss_shift], axis=-1),
+                                np.stack([ss_shift, fs_shift], axis=-1))
+        pixel_dims = np.where(transposed,
+                              np.stack([fs_pixels, ss_pixels], axis=-1),
+                              np.stack([ss_pixels, fs_pixels], axis=-1))
+        corner_idx = corner_pos + corner_shift
+        # Offset by centre to make all coordinates >= 0
+        centre = -corner_idx.reshape(-1, 2).min(axis=0)
+        corner_idx += centre
+        size_yx = (corner_idx + pixel_dims).reshape(-1, 2).max(axis=0)
+        self._tiles_cache = {
+            'corner_idx': corner_idx,
+            'pixel_dims': pixel_dims,
+            'ss_vec': ss_vec,
+            'fs_vec': fs_vec,
+            'centre': centre,
+            'size_yx': tuple(size_yx),
+        }
+        return self._tiles_cache
 
     def get_quad_corners(self, quad, centre):
         """Get the bounding box of a quad.
@@ -90,23 +302,12 @@ class GeometryAssembler:
             quad (int): quadrant number
             centre (tuple): y, x coordinates of the detector centre
         """
-        modules = Defaults.quad2slice[self.detector_name][quad]
-        X = []
-        Y = []
-        for module in self.snapped_geom.modules[modules]:
-            for tile in module:
-                # Offset by centre to make all coordinates positive
-                y, x = tile.corner_idx + centre - self.snapped_geom.centre
-                h, w = tile.pixel_dims
-                Y.append(y)
-                Y.append(y+h)
-                X.append(x)
-                X.append(x)
-        dy = abs(max(Y) - min(Y))
-        dx = abs(max(X) - min(X))
-        return (min(X)-2, min(Y)-2), dx+w+4, dy+4
-
-    def position_all_modules(self, data, canvas=None):
+        x, y, dx, dy = self._quad_bounds(quad)
+        # Offset by centre to make all coordinates positive
+        oy, ox = np.asarray(centre) - self._snapped_tiles()['centre']
+        return (x+ox-2, y+oy-2), dx+4, dy+4
+
+    def position_all_modules(self, data, canvas=None, fill=np.nan, out=None):
         """Assemble data from this detector according to where the pixels are.
 
         Parameters
@@ -118,6 +319,18 @@ class GeometryAssembler:
         canvas : tuple
           The shape of the canvas the out array will be embedded in.
           If None is given (default) no embedding will be applied.
+        fill : float
+          Value of the pixels that are not covered by any detector tile
+          (default: nan, 0 for integer data). A fill that the data type
+          can't hold raises a ValueError. If None is given the output
+          array is not initialised and the gap pixels are undefined.
+        out : ndarray
+          Array to assemble the data into, e.g. from
+          :meth:`make_output_array`. Use this to recycle the same array when
+          assembling many frames. On a canvas, the pixels not covered by any
+          detector tile are reset to fill, so the array can be reused after
+          moving quadrants; pass fill=None to leave them untouched. Without
+          a canvas the gap pixels always keep their previous contents.
 
         Returns
         -------
@@ -127,18 +340,229 @@ class GeometryAssembler:
         centre : ndarray
           (y, x) pixel location of the detector centre in this geometry.
         """
+        reset_gaps = False
+        if out is None:
+            if canvas is None and fill is not None and np.isnan(fill):
+                return self.exgeom_obj.position_modules_fast(data)
+            out = self.make_output_array(data.shape, data.dtype, canvas, fill)
+        elif out.shape != self._output_shape(data.shape, canvas):
+            raise ValueError('Output array shape is wrong: {} - expected {}'
+                             .format(out.shape,
+                                     self._output_shape(data.shape, canvas)))
+        else:
+            reset_gaps = fill is not None
         if canvas is None:
-            return self.exgeom_obj.position_modules_fast(data)
+            return self.exgeom_obj.position_modules_fast(data, out=out)
         else:
-            out_shape = data.shape[:-3] + tuple(canvas)
-            if np.issubdtype(data.dtype, np.floating):
-                out = np.full(out_shape, np.nan, dtype=data.dtype)
+            if data.shape[-3:] != self.exgeom_obj.expected_data_shape:
+                raise ValueError('Wrong shape for detector data: {} does not '
+                                 'end with {}'.format(
+                                     data.shape,
+                                     self.exgeom_obj.expected_data_shape))
+            canvas = tuple(canvas)
+            if reset_gaps:
+                np.copyto(out, self._fill_value(out.dtype, fill),
+                          where=self._gap_mask(canvas))
+            if _assemble_numba.HAVE_NUMBA and out.flags.c_contiguous:
+                _assemble_numba.assemble(
+                    data.reshape((-1,) + data.shape[-3:]),
+                    out.reshape((-1,) + out.shape[-2:]),
+                    self._plan_table(canvas))
             else:
-                out = np.zeros(out_shape, dtype=data.dtype)
-            self.exgeom_obj.position_modules_symmetric(data, out=out)
+                for src, dst, transpose in self._assembly_plan(canvas):
+                    tile_data = data[src]
+                    out[dst] = (tile_data.swapaxes(-1, -2) if transpose
+                                else tile_data)
             cv_centre = (canvas[0]//2, canvas[-1]//2)
             return out, cv_centre
 
+    def position_all_modules_cupy(self, data, canvas, fill=np.nan, out=None):
+        """Assemble data held on the GPU onto a canvas using CuPy.
+
+        This works like :meth:`position_all_modules` with a canvas, but data
+        and out are cupy arrays, so the assembled image stays on the GPU.
+        Requires cupy to be installed.
+
+        Parameters
+        ----------
+
+        data : cupy.ndarray
+          The last three dimensions should be channelno, pixel_ss, pixel_fs.
+        canvas : tuple
+          The shape of the canvas the out array will be embedded in.
+        fill : float
+          Value of the pixels that are not covered by any detector tile
+          (default: nan, 0 for integer data). A fill that the data type
+          can't hold raises a ValueError. If None is given these pixels
+          are not initialised.
+        out : cupy.ndarray
+          Array to assemble the data into, its gap pixels are reset to fill.
+
+        Returns
+        -------
+        out : cupy.ndarray
+          Array with one dimension fewer than the input.
+        centre : tuple
+          (y, x) pixel location of the detector centre on the canvas.
+        """
+        if cp is None:
+            raise ImportError('position_all_modules_cupy requires cupy')
+        canvas = tuple(canvas)
+        if data.shape[-3:] != self.exgeom_obj.expected_data_shape:
+            raise ValueError('Wrong shape for detector data: {} does not '
+                             'end with {}'.format(
+                                 data.shape,
+                                 self.exgeom_obj.expected_data_shape))
+        shape = self._output_shape(data.shape, canvas)
+        if out is None:
+            out = self._output_array(shape, data.dtype, fill, xp=cp)
+        elif out.shape != shape:
+            raise ValueError('Output array shape is wrong: {} - expected {}'
+                             .format(out.shape, shape))
+        elif fill is not None:
+            cp.copyto(out, self._fill_value(out.dtype, fill),
+                      where=self._gap_mask_gpu(canvas))
+        # Each tile is one strided device to device copy
+        for src, dst, transpose in self._assembly_plan(canvas):
+            tile_data = data[src]
+            out[dst] = tile_data.swapaxes(-1, -2) if transpose else tile_data
+        return out, (canvas[0]//2, canvas[-1]//2)
+
+    def _assembly_plan(self, canvas):
+        """Get the instructions to copy all tiles onto a canvas.
+
+        Returns a list of (src, dst, transpose) tuples, one for each tile.
+        The source slices include flipping the tile, so that
+        out[dst] = data[src] (transposed if needed) places the tile with the
+        detector centre in the middle of the canvas. The plan is only
+        recalculated after the quadrants were moved or if the canvas changes.
+
+        Parameters:
+            canvas (tuple): shape of the canvas
+        """
+        if self._plan_cache[0] == canvas:
+            return self._plan_cache[1]
+        tiles = self._snapped_tiles()
+        min_shape = np.maximum(tiles['centre'] * 2, tiles['size_yx'])
+        if (np.array(canvas) < min_shape).any():
+            raise ValueError('Canvas shape {} less than required {}'
+                             .format(canvas, tuple(min_shape)))
+        # Offset of the detector to put its centre in the middle of the canvas
+        oy, ox = np.array(canvas) // 2 - tiles['centre']
+        # Find where the tiles are in the module data by splitting an array
+        # of pixel numbers
+        ss_pixels, fs_pixels = self.exgeom_obj.expected_data_shape[-2:]
+        pixels = np.arange(ss_pixels * fs_pixels).reshape(ss_pixels, fs_pixels)
+        tile_pixels = self.exgeom_obj.split_tiles(pixels)
+        # Snapped vectors are (y, x); fast scan along y needs transposing
+        transposed = tiles['fs_vec'][..., 0] != 0
+        ss_order = np.where(transposed, tiles['ss_vec'][..., 1],
+                            tiles['ss_vec'][..., 0])
+        fs_order = np.where(transposed, tiles['fs_vec'][..., 0],
+                            tiles['fs_vec'][..., 1])
+        dst_start = tiles['corner_idx'] + [int(oy), int(ox)]
+        dst_end = dst_start + tiles['pixel_dims']
+        plan = []
+        for modno in range(len(dst_start)):
+            for t, tile_px in enumerate(tile_pixels):
+                ss, fs = divmod(int(tile_px[0, 0]), fs_pixels)
+                h, w = tile_px.shape
+                src = (Ellipsis, modno,
+                       _tile_slice(ss, h, ss_order[modno, t]),
+                       _tile_slice(fs, w, fs_order[modno, t]))
+                (y0, x0), (y1, x1) = dst_start[modno, t], dst_end[modno, t]
+                dst = (Ellipsis, slice(int(y0), int(y1)), slice(int(x0), int(x1)))
+                plan.append((src, dst, bool(transposed[modno, t])))
+        self._plan_cache = (canvas, plan)
+        return plan
+
+    def _plan_table(self, canvas):
+        """Get the assembly plan for a canvas as an integer table.
+
+        Parameters:
+            canvas (tuple): shape of the canvas
+        """
+        if self._plan_table_cache[0] != canvas:
+            table = _assemble_numba.plan_table(
+                self._assembly_plan(canvas), self.exgeom_obj.expected_data_shape)
+            self._plan_table_cache = (canvas, table)
+        return self._plan_table_cache[1]
+
+    def _gap_mask(self, canvas):
+        """Get a boolean mask of the canvas pixels not covered by any tile.
+
+        Parameters:
+            canvas (tuple): shape of the canvas
+        """
+        if self._gaps_cache[0] == canvas:
+            return self._gaps_cache[1]
+        gaps = np.ones(canvas, dtype=bool)
+        for _, dst, _ in self._assembly_plan(canvas):
+            gaps[dst] = False
+        self._gaps_cache = (canvas, gaps)
+        return gaps
+
+    def _gap_mask_gpu(self, canvas):
+        """Get the gap mask from _gap_mask as a cupy array on the GPU.
+
+        Parameters:
+            canvas (tuple): shape of the canvas
+        """
+        if self._gaps_gpu_cache[0] == canvas:
+            return self._gaps_gpu_cache[1]
+        gaps = cp.asarray(self._gap_mask(canvas))
+        self._gaps_gpu_cache = (canvas, gaps)
+        return gaps
+
+    def make_output_array(self, data_shape, dtype=np.float64, canvas=None,
+                          fill=np.nan):
+        """Create an array to be passed as out to position_all_modules.
+
+        Parameters:
+            data_shape (tuple): Shape of the data that is to be assembled
+            dtype (numpy.dtype): Data type of the data that is to be assembled
+            canvas (tuple): Shape of the canvas the data is embedded in
+            fill (float): Value of the pixels not covered by the detector
+        """
+        return self._output_array(self._output_shape(data_shape, canvas),
+                                  dtype, fill)
+
+    def _output_shape(self, data_shape, canvas=None):
+        """Get the shape of the array returned by position_all_modules."""
+        if canvas is None:
+            return tuple(data_shape[:-3]) + self._snapped_tiles()['size_yx']
+        return tuple(data_shape[:-3]) + tuple(canvas)
+
+    @staticmethod
+    def _output_array(shape, dtype, fill, xp=np):
+        """Create an output array for position_all_modules.
+
+        xp is the array module (numpy or cupy) to create the array with.
+        """
+        if fill is None:
+            # Skip initialising the array, gaps between tiles are undefined
+            return xp.empty(shape, dtype=dtype)
+        return xp.full(shape, GeometryAssembler._fill_value(dtype, fill),
+                       dtype=dtype)
+
+    @staticmethod
+    def _fill_value(dtype, fill):
+        """Get the value to fill the gaps of an array of this dtype with.
+
+        Integer arrays can't hold the default nan, they are filled with 0
+        instead. Any other fill the dtype can't represent is an error.
+        """
+        if np.issubdtype(dtype, np.inexact):
+            return fill
+        if np.isnan(fill):
+            return 0
+        with np.errstate(invalid='ignore', over='ignore'):
+            value = np.array(fill).astype(dtype)
+        if value != fill:
+            raise ValueError('Fill value {!r} can not be represented as {}'
+                             .format(fill, np.dtype(dtype)))
+        return value
+
     def write_crystfel_geom(self, filename, *,
                             data_path='/entry_1/instrument_1/detector_1/data',
                             mask_path=None, dims=('frame', 'modno', 'ss', 'fs'),
@@ -251,18 +675,17 @@ adu_per_eV = 0.0075
                 exgeom_obj = AGIPD_1MGeometry.from_crystfel_geom(temp.name)
         return cls(exgeom_obj)
 
-    @property
-    def quad_pos(self):
-        """Get quadrant positions."""
-        return pd.DataFrame(self.exgeom_obj.quad_positions(),
-                            index=['q{}'.format(i) for i in range(1, 5)],
-                            columns=['X', 'Y'])
+    def _get_quad_pos(self):
+        """Calculate the quadrant positions of the current geometry."""
+        return self.exgeom_obj.quad_positions()
 
 
 class DSSCGeometry(GeometryAssembler):
     """Detector layout for DSSC."""
     detector_name = 'DSSC'
+    # Step to the next row of hexagons is 1.5/sqrt(3) of the step in a row
     pixel_aspect_ratio = 1.5/np.sqrt(3)
+    _pixel_shape = np.array([1., pixel_aspect_ratio])
 
     def __init__(self, exgeom_obj, filename):
         """Set the properties for DSSC detector.
@@ -277,7 +700,6 @@ class DSSCGeometry(GeometryAssembler):
         self.unit = 1e-3
         self.frag_ss_pixels = 128
         self.frag_fs_pixels = 256
-        self._pixel_shape = np.array([1., 1.5/np.sqrt(3)])
 
     @classmethod
     def from_h5_file_and_quad_positions(cls, geom_file, quad_pos=None):
@@ -312,56 +734,70 @@ class DSSCGeometry(GeometryAssembler):
         module_step_vec = np.array([0, frag_height + panel_gap_m, 0])
         tile_step_vec = np.array([frag_width + asic_gap_m, 0, 0])
 
-        modules = []
-
-        for p in range(cls.n_modules):
-            Q = p // 4
-            x_orient = quads_x_orientation[Q]
-            y_orient = quads_y_orientation[Q]
-            quad_corner_x = quad_pos[Q][0] * unit
-            quad_corner_y = quad_pos[Q][1] * unit
-
-            p_in_quad = p % 4
-
-            # Measuring in terms of the step within a row, the
-            # step to the next row of hexagons is 1.5/sqrt(3).
-            ss_vec = np.array([0, y_orient, 0]) * cls.pixel_size * 1.5 / np.sqrt(3)
-            fs_vec = np.array([x_orient, 0, 0]) * cls.pixel_size
-
-            # Corner position is measured at low-x, low-y corner (bottom
-            # right as plotted). We want the position of the corner
-            # with the first pixel, which is either high-x low-y or
-            # low-x high-y.
-            if x_orient == -1:
-                quad_start_x = quad_corner_x + module_width
-                quad_start_y = quad_corner_y
-            else:  # y_orient == -1
-                quad_start_x = quad_corner_x
-                quad_start_y = quad_corner_y + quad_height
-
-            quad_start = np.array([quad_start_x, quad_start_y, 0.])
-            module_start = quad_start + (y_orient * p_in_quad * module_step_vec)
-
-            modules.append([
-                GeometryFragment(
-                    corner_pos=module_start + (x_orient * t * tile_step_vec),
-                    ss_vec=ss_vec,
-                    fs_vec=fs_vec,
-                    ss_pixels=cls.frag_ss_pixels,
-                    fs_pixels=cls.frag_fs_pixels,
-                ) for t in range(cls.n_tiles_per_module)
-            ])
+        quad = np.arange(cls.n_modules) // 4
+        p_in_quad = np.arange(cls.n_modules) % 4
+        x_orient = np.array(quads_x_orientation)[quad]
+        y_orient = np.array(quads_y_orientation)[quad]
+
+        # Measuring in terms of the step within a row, the
+        # step to the next row of hexagons is 1.5/sqrt(3).
+        ss_vecs = np.outer(y_orient, [0, 1, 0]) * cls.pixel_size * 1.5 / np.sqrt(3)
+        fs_vecs = np.outer(x_orient, [1, 0, 0]) * cls.pixel_size
+
+        # Corner position is measured at low-x, low-y corner (bottom
+        # right as plotted). We want the position of the corner
+        # with the first pixel, which is either high-x low-y (x_orient == -1)
+        # or low-x high-y (y_orient == -1).
+        quad_start = np.zeros((cls.n_modules, 3))
+        quad_start[:, :2] = np.asarray(quad_pos, dtype=np.float64)[quad] * unit
+        quad_start[:, 0] += np.where(x_orient == -1, module_width, 0)
+        quad_start[:, 1] += np.where(x_orient == -1, 0, quad_height)
+        module_start = quad_start + ((y_orient * p_in_quad)[:, np.newaxis]
+                                     * module_step_vec)
+
+        # One contiguous (n_modules, n_tiles, 3, 3) array holds corner_pos,
+        # ss_vec and fs_vec of all tiles, the fragments get views into it
+        tile_no = np.arange(cls.n_tiles_per_module)
+        tile_vecs = np.empty((cls.n_modules, cls.n_tiles_per_module, 3, 3))
+        tile_vecs[:, :, 0] = module_start[:, np.newaxis] + (
+            (x_orient[:, np.newaxis] * tile_no)[..., np.newaxis] * tile_step_vec)
+        tile_vecs[:, :, 1] = ss_vecs[:, np.newaxis]
+        tile_vecs[:, :, 2] = fs_vecs[:, np.newaxis]
+
+        modules = [[
+            GeometryFragment(
+                corner_pos=tile_vecs[p, t, 0],
+                ss_vec=tile_vecs[p, t, 1],
+                fs_vec=tile_vecs[p, t, 2],
+                ss_pixels=cls.frag_ss_pixels,
+                fs_pixels=cls.frag_fs_pixels,
+            ) for t in range(cls.n_tiles_per_module)
+        ] for p in range(cls.n_modules)]
 
         return cls(modules)
 
 
-    @property
-    def quad_pos(self):
-        """Get the quadrant positions from the geometry object."""
-        quad_pos = self.exgeom_obj.quad_positions(self.filename)
-        return pd.DataFrame(quad_pos,
-                            columns=['X', 'Y'],
-                            index=['q{}'.format(i) for i in range(1, 5)])
+    def _get_offsets(self, h5file):
+        """Read the offsets of Q?/M1/T01 from an open XFEL geometry file."""
+        mod_offset = np.stack([h5file['Q{}/M1/Position'.format(q)][:2]
+                               for q in range(1, 5)])
+        tile_offset = np.stack([h5file['Q{}/M1/T01/Position'.format(q)][:2]
+                                for q in range(1, 5)])
+        return mod_offset + tile_offset
+
+    def _get_quad_pos(self):
+        """Calculate the quadrant positions of the current geometry."""
+        if self.filename is None:
+            # Low-x, low-y corner of all tiles in each quadrant
+            corners = self._current_corners() / self.unit
+            quad_pos = corners.reshape(4, -1, 2).min(axis=1)
+        else:
+            # XFEL HDF5 geometry files record the position of the low-x,
+            # low-y corner of M1 T1 relative to the quadrant position.
+            m1t1 = self._current_corners()[::4, 0]
+            tile_pos = m1t1.min(axis=1) / self.unit
+            quad_pos = tile_pos - self._file_offsets()
+        return quad_pos
 
 
 class LPDGeometry(GeometryAssembler):
@@ -403,13 +839,27 @@ class LPDGeometry(GeometryAssembler):
         # the .geom filename here
         return cls(exgeom_obj, None)
 
-    @property
-    def quad_pos(self):
-        """Get the quadrant positions from the geometry object."""
-        quad_pos = self.exgeom_obj.quad_positions(self.filename)
-        return pd.DataFrame(quad_pos,
-                            columns=['X', 'Y'],
-                            index=['q{}'.format(i) for i in range(1, 5)])
+    def _get_offsets(self, h5file):
+        """Read the offsets of Q?/M4/T16 from an open XFEL geometry file."""
+        mod_offset = np.stack([h5file['Q{}/M4/Position'.format(q)][:2]
+                               for q in range(1, 5)])
+        tile_offset = np.stack([h5file['Q{}/M4/T16/Position'.format(q)][:2]
+                                for q in range(1, 5)])
+        return mod_offset + tile_offset
+
+    def _get_quad_pos(self):
+        """Calculate the quadrant positions of the current geometry."""
+        if self.filename is None:
+            # High-x, high-y corner of all tiles in each quadrant
+            corners = self._current_corners() / self.unit
+            quad_pos = corners.reshape(4, -1, 2).max(axis=1)
+        else:
+            # XFEL HDF5 geometry files for LPD record the position of the
+            # high-x, high-y corner of M4 T16 relative to the quadrant position.
+            m4t16 = self._current_corners()[3::4, 15]
+            tile_pos = m4t16.max(axis=1) / self.unit
+            quad_pos = tile_pos - self._file_offsets()
+        return quad_pos
 
 
 GEOM_CLASSES = {
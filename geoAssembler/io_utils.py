@@ -47,7 +47,6 @@ def write_geometry(geom, filename, logger):
         filename (str): Output filename
         logger (logging.Logger): Logging object to display information
     """
-    from .geometry import AGIPDGeometry, DSSCGeometry, LPDGeometry
     if isinstance(geom, AGIPDGeometry):
         geom.write_crystfel_geom(filename)
     elif isinstance(geom, (DSSCGeometry, LPDGeometry)):
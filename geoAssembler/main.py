@@ -5,14 +5,11 @@ from argparse import ArgumentParser
 import logging
 from pathlib import Path
 
-from .nb import create_nb, NB_FILE, NB_DIR
+from .nb import create_nb, NB_FILE, NB_DIR, RUNDIR
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 log = logging.getLogger(__name__)
 
-# Default run directory
-RUNDIR = '/gpfs/exfel/exp/XMPL/201750/p700000/proc/r0005'
-
 
 def main(argv=None):
     """Define the help string."""
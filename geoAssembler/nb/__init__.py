@@ -1 +1 @@
-from .template import create_nb, NB_DIR, NB_FILE
\ No newline at end of file
+from .template import create_nb, NB_DIR, NB_FILE, RUNDIR
\ No newline at end of file
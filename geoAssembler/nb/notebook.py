@@ -1,6 +1,5 @@
 
 """Jupyter Version of the detector geometry calibration."""
-from copy import copy
 import logging
 import os
 
@@ -8,8 +7,9 @@ import numpy as np
 
 from ipywidgets import widgets, Layout
 from IPython.display import display
-from matplotlib import pyplot as plt, cm
+from matplotlib import colormaps, pyplot as plt
 from matplotlib import transforms
+from matplotlib.collections import LineCollection
 from matplotlib.patches import Ellipse, Rectangle
 
 
@@ -95,18 +95,15 @@ class SquareShape(Rectangle):
         Rotation of the object
         """
 
-        ts = ax.transData
         self.size = size
         self.centre = centre[::-1]
         self.aspect = aspect
-        coords = ts.transform(self.centre)
-        tr = transforms.Affine2D().rotate_deg_around(coords[0], coords[1], angle)
-        t= ts + tr
         self.ax = ax
         self._angle = angle
         #Rotated rectangle patch
         super().__init__(self.centre, size*self.aspect, size,
-                         facecolor='none', edgecolor='r', lw=1, transform=t)
+                         facecolor='none', edgecolor='r', lw=1,
+                         transform=self._rotation(angle) + ax.transData)
         y = self.get_y() - size/2
         x = self.get_x() - size/2 * aspect
         self.set_y(y)
@@ -128,13 +125,23 @@ class SquareShape(Rectangle):
     def get_size(self):
         return self.get_height()
 
+    def _rotation(self, angle):
+        """Rotation around the centre, in data coordinates.
+
+        The rotation has to keep the square a square on screen, so the y
+        axis is scaled to the displayed aspect ratio while rotating.
+        """
+        ratio = self.aspect
+        if self.ax.xaxis_inverted() != self.ax.yaxis_inverted():
+            # A mirrored view turns the rotation the other way
+            ratio = -ratio
+        cx, cy = self.centre
+        return (transforms.Affine2D().translate(-cx, -cy).scale(1, ratio)
+                .rotate_deg(angle).scale(1, 1 / ratio).translate(cx, cy))
+
     def set_angle(self, angle):
         """Rotate the square by a given angle."""
-        ts = self.ax.transData
-        coords = ts.transform(self.centre)
-        tr = transforms.Affine2D().rotate_deg_around(coords[0], coords[1], angle)
-        t = ts + tr
-        self.set_transform(t)
+        self.set_transform(self._rotation(angle) + self.ax.transData)
         self._angle = angle
 
     def get_angle(self):
@@ -187,19 +194,22 @@ class MainWidget:
         self.data = raw_data
         Defaults.check_detector(det)
         self.im = None
-        self.vmin = vmin or np.nanmin(self.data)
-        self.vmax = vmax or np.nanmax(self.data)
-        self.raw_data = np.clip(raw_data, self.vmin, self.vmax)
+        # Only scan the data for limits that weren't given (0 is valid)
+        self.vmin = np.nanmin(self.data) if vmin is None else vmin
+        self.vmax = np.nanmax(self.data) if vmax is None else vmax
+        # No need to clip the data, imshow saturates it at vmin/vmax
+        self.raw_data = raw_data
         self.figsize = figsize or (8, 8)
         self.bg = bg or 'w'
         self.shapes = {}
         self.quad = None
         self.frontview = frontview
-        self.cmap = copy(cm.get_cmap(Defaults.cmaps[0]))
+        self._cmaps = {}
         try:
-            self.cmap.set_bad(self.bg)
+            self.cmap = self._get_cmap(Defaults.cmaps[0])
         except (ValueError, KeyError):
             self.bg = 'w'
+            self.cmap = self._get_cmap(Defaults.cmaps[0])
 
         if (geometry is None) or isinstance(geometry, (str, bytes, os.PathLike)):
             self.geom = read_geometry(det, geometry)
@@ -208,9 +218,16 @@ class MainWidget:
         self.aspect = aspect or self.geom.pixel_aspect_ratio
 
         data, _ = self.geom.position_all_modules(self.raw_data)
-        # Create a canvas
-        self.canvas = np.full(np.array(data.shape) + Defaults.canvas_margin,
-                              np.nan)
+        # Create a canvas, the data is assembled into it in place. Single
+        # precision is plenty for display and halves the redraw traffic.
+        dtype = self.raw_data.dtype
+        if dtype == np.float64:
+            dtype = np.float32
+        self.canvas = self.geom.make_output_array(
+            self.raw_data.shape, dtype,
+            canvas=np.array(data.shape) + Defaults.canvas_margin)
+        # Data assembled on the canvas, keyed on the quadrant offsets
+        self._assembled = (None, None)
         self._add_widgets()
         self.update_plot(plot_range=(self.vmin, self.vmax), **kwargs)
         self.rect = None
@@ -221,12 +238,22 @@ class MainWidget:
     @property
     def centre(self):
         """Return the centre of the image (beam)."""
-        return self.geom.position_all_modules(self.raw_data)[1]
+        return self.geom.snapped_geom.centre
+
+    def assemble(self):
+        """Get the data assembled on the canvas and the canvas centre.
+
+        The data is only reassembled after quadrants were moved.
+        """
+        key = self.geom.quad_offsets.tobytes()
+        if self._assembled[0] != key:
+            self._assembled = (key, self.geom.position_all_modules(
+                self.raw_data, canvas=self.canvas.shape, out=self.canvas))
+        return self._assembled[1]
 
     def draw_shape(self, shape_type, size, num, angle=0):
         """Draw helper object and add it to the shapess collection."""
-        _, centre = self.geom.position_all_modules(self.raw_data,
-                                                canvas=self.canvas.shape)
+        _, centre = self.assemble()
         if shape_type.lower() == 'circle':
             self.shapes[num] = CircleShape(centre, size,
                                        self.ax, self.aspect,
@@ -236,25 +263,29 @@ class MainWidget:
                                        self.ax, self.aspect,
                                        angle=angle)
 
-        self.ax.add_patch(self.shapes[num])
+        # Shapes shouldn't extend the data limits, so skip add_patch's
+        # data limit update and add them as plain artists
+        self.ax.add_artist(self.shapes[num])
 
     def draw_quad_bound(self, pos):
         """Draw a rectangle around around a given quadrant."""
-        try:
-            # Remove the old one first if there is any
-            self.rect.remove()
-        except (AttributeError, ValueError):
-            pass
         if pos is None:
-            # If none then no new rectangle should be drawn
+            # If none then the rectangle should be hidden
+            if self.rect is not None:
+                self.rect.set_visible(False)
             return
         P, dx, dy =\
             self.geom.get_quad_corners(pos,
                 np.array(self.data.shape, dtype='i')//2)
 
-        self.rect = Rectangle(P, dx, dy, linewidth=1.5, edgecolor='r',
-                              facecolor='none')
-        self.ax.add_patch(self.rect)
+        if self.rect is None:
+            self.rect = Rectangle(P, dx, dy, linewidth=1.5, edgecolor='r',
+                                  facecolor='none')
+            self.ax.add_patch(self.rect)
+        else:
+            # Reuse the rectangle instead of creating a new one
+            self.rect.set_bounds(*P, dx, dy)
+            self.rect.set_visible(True)
         self.update_plot(plot_range=None)
 
     def _add_tabs(self):
@@ -284,56 +315,64 @@ class MainWidget:
                                          description='Color Map:',
                                          disabled=False,
                                          layout=Layout(width='200px'))
-        self.cmap_sel.observe(self._set_cmap)
-        self.val_slider.observe(self._set_clim)
+        self.cmap_sel.observe(self._set_cmap, names='value')
+        self.val_slider.observe(self._set_clim, names='value')
         self._add_tabs()
 
     def _set_clim(self, plot_range):
         """Update the color limits."""
-        try:
-            vmin, vmax = plot_range['new'][0], plot_range['new'][-1]
-        except KeyError:
+        vmin, vmax = plot_range['new']
+        if (vmin, vmax) == self.im.get_clim():
             return
+        # The colorbar follows the image norm, only the ticks need updating
         self.im.set_clim(vmin, vmax)
-        self.cbar.update_bruteforce(self.im)
         cbar_ticks = np.linspace(vmin, vmax, 6)
         self.cbar.set_ticks(cbar_ticks)
+        self.fig.canvas.draw_idle()
 
     def _set_cmap(self, sel):
         """Update the colormap."""
         try:
-            cmap_val = str(sel['new'])
-        except KeyError:
+            self.im.set_cmap(self._get_cmap(sel['new']))
+        except (ValueError, KeyError):
             return
 
+    def _get_cmap(self, name):
+        """Get a colormap showing missing data in the background colour.
+
+        The colormaps are only created once per name.
+        """
         try:
-            cmap = copy(cm.get_cmap(cmap_val))
-            cmap.set_bad(self.bg)
-            self.im.set_cmap(cmap)
-        except ValueError:
-            return
+            return self._cmaps[name]
+        except KeyError:
+            cmap = colormaps[name].with_extremes(bad=self.bg)
+            self._cmaps[name] = cmap
+            return cmap
 
     @property
     def quad_pos(self):
         return self.geom.quad_pos
 
+    @staticmethod
+    def _cross_segments(cy, cx):
+        """Get the horizontal and vertical line of the centre cross hair."""
+        return [[(cx-20, cy), (cx+20, cy)], [(cx, cy-20), (cx, cy+20)]]
+
     def update_plot(self, plot_range=(None, None),
                     cmap=Defaults.cmaps[0], **kwargs):
         """Update the plotted image."""
-        self.data, cnt = self.geom.position_all_modules(self.raw_data,
-                                                        self.canvas.shape)
+        self.data, cnt = self.assemble()
         cy, cx = cnt
         if self.im is not None:
             if plot_range is not None:
                 self.im.set_clim(*plot_range)
-            else:
+            if self._shown != self._assembled[0]:
+                # Only hand the image over if it changed, set_array copies
+                # it, and move the existing cross hair with it
                 self.im.set_array(self.data)
-            h1, h2 = self.cent_cross
-            h1.remove()
-            h2.remove()
-            h1 = self.ax.hlines(cy, cx-20, cx+20, colors='r', linewidths=1)
-            h2 = self.ax.vlines(cx, cy-20, cy+20, colors='r', linewidths=1)
-            self.cent_cross = (h1, h2)
+                self.cent_cross.set_segments(self._cross_segments(cy, cx))
+                self._shown = self._assembled[0]
+            self.fig.canvas.draw_idle()
         else:
             self.fig = plt.figure(figsize=self.figsize,
                                   clear=True, facecolor=self.bg)
@@ -342,9 +381,9 @@ class MainWidget:
                 self.data, vmin=plot_range[0], vmax=plot_range[1],
                 cmap=self.cmap, origin='lower', **kwargs)
             self.ax.set_xticks([]), self.ax.set_yticks([])
-            h1 = self.ax.hlines(cy, cx-20, cx+20, colors='r', linewidths=1)
-            h2 = self.ax.vlines(cx, cy-20, cy+20, colors='r', linewidths=1)
-            self.cent_cross = (h1, h2)
+            self.cent_cross = LineCollection(self._cross_segments(cy, cx),
+                                             colors='r', linewidths=1)
+            self.ax.add_collection(self.cent_cross)
             self.fig.subplots_adjust(bottom=0,
                                      top=1,
                                      hspace=0,
@@ -361,5 +400,6 @@ class MainWidget:
             cbar_ticks = np.linspace(plot_range[0], plot_range[-1], 6)
             self.cbar.set_ticks(cbar_ticks)
             self.ax.set_aspect(self.aspect)
+            self._shown = self._assembled[0]
             if self.frontview:
                 self.ax.invert_xaxis()
@@ -1,11 +1,13 @@
 """Define the Widget tabs that are using in CalibrateNb."""
 
-from copy import copy
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
 import logging
 
 from ipywidgets import widgets, Layout
-from matplotlib import cm
+from matplotlib import colormaps
+import numpy as np
 import pyFAI
 import pyFAI.calibrant
 from pyFAI.azimuthalIntegrator import AzimuthalIntegrator
@@ -14,9 +16,18 @@ from scipy import constants
 from ..calibrants import calibrants, celldir
 log = logging.getLogger(__name__)
 
+# Planck constant times speed of light [J m] over the electron volt [J]:
+# the photon wavelength in m for an energy of 1 eV
+HC_OVER_EV = constants.h * constants.c / constants.eV
+
+# One worker thread shared by all calibrant tabs to calculate ring overlays
+_overlay_pool = ThreadPoolExecutor(max_workers=1)
+
 
 class ShapeTab(widgets.VBox):
     """Tab for geometry calibration with Shapes."""
+    redraw_delay = 0.05  # Seconds without quadrant moves before redrawing
+
     def __init__(self, parent):
         """Add tab to calibrate geometry to the main widget.
 
@@ -25,7 +36,7 @@ class ShapeTab(widgets.VBox):
         """
         self.parent = parent
         self.title = 'Fit Objects'
-        self.counts = 0
+        self._pending_redraw = None
 
         self.selection = widgets.Dropdown(options=['None', '1', '2', '3', '4'],
                                           value='None',
@@ -72,6 +83,7 @@ class ShapeTab(widgets.VBox):
         for n, shape in self.parent.shapes.items():
             shape.remove()
         self.parent.shapes = {}
+        self.current_shape = None
         self.row2 = widgets.HBox([self.shape_type_dn, self.shape_btn, self.clr_btn])
         self.children = [self.row1, self.row2]
 
@@ -114,10 +126,8 @@ class ShapeTab(widgets.VBox):
         if num >= 10:  # Draw only 10 circles at max
             return
         size = 350
-        for shape in self.parent.shapes.values():
-            shape.set_edgecolor('gray')
         self.parent.draw_shape(self.shape_type, size, num)
-        self.current_shape = num
+        self._highlight_shape(num)
         shapes = self._shape_rpr
         self.shape_drn = widgets.Dropdown(options=shapes,
                                         value=shapes[num],
@@ -131,25 +141,22 @@ class ShapeTab(widgets.VBox):
         self.children = [self.row1, self.row2]
 
 
+    def _update_shape_drn(self):
+        """Relabel the shapes in the selection dropdown."""
+        # Changing the options resets the selection, which mustn't be
+        # taken as the user selecting a shape
+        self.shape_drn.unobserve(self._sel_shape, names='value')
+        try:
+            shapes = self._shape_rpr
+            self.shape_drn.options = shapes
+            self.shape_drn.value = shapes[self.current_shape]
+        finally:
+            self.shape_drn.observe(self._sel_shape, names='value')
+
     def _set_angle(self, prop):
         """Set the angle of the shape."""
-        angle = prop['new']
-        shape = self.parent.shapes[self.current_shape]
-        shape.set_angle(angle)
-        size = shape.get_size()
-        shapes = self._shape_rpr
-        self.shape_drn = widgets.Dropdown(options=shapes,
-                                        value=shapes[self.current_shape],
-                                        disabled=False,
-                                        description='Sel.:',
-                                        layout=Layout(width='220px',
-                                                      height='30px'))
-
-        self.shape_drn.observe(self._sel_shape, names='value')
-        self.row2 = widgets.HBox([self.shape_type_dn, self.shape_btn, self.clr_btn,
-                                  self.shape_drn] + self._create_spin_boxes(size, angle))
-        self.children = [self.row1, self.row2]
-
+        self.parent.shapes[self.current_shape].set_angle(prop['new'])
+        self._update_shape_drn()
 
     def _set_size(self, selection):
         """Set the shape size."""
@@ -158,43 +165,53 @@ class ShapeTab(widgets.VBox):
         except TypeError:
             return
 
-        shape = self.parent.shapes[self.current_shape]
-        shape.set_size(size)
-        angle = shape.get_angle()
-        shapes = self._shape_rpr
-        self.shape_drn = widgets.Dropdown(options=shapes,
-                                        value=shapes[self.current_shape],
-                                        disabled=False,
-                                        description='Sel.:',
-                                        layout=Layout(width='220px',
-                                                      height='30px'))
-        self.shape_drn.observe(self._sel_shape, names='value')
-        self.row2 = widgets.HBox([self.shape_type_dn, self.shape_btn, self.clr_btn,
-                                  self.shape_drn] + self._create_spin_boxes(size, angle))
-        self.children = [self.row1, self.row2]
-
+        self.parent.shapes[self.current_shape].set_size(size)
+        self._update_shape_drn()
 
 
     def _sel_shape(self, selection):
         """Select-helper circles."""
-        self.current_shape = int(selection['new'].split(':')[0])
+        self._highlight_shape(int(selection['new'].split(':')[0]))
         size = int(self.parent.shapes[self.current_shape].get_size())
         angle = int(self.parent.shapes[self.current_shape].get_angle())
-        for num, shape in self.parent.shapes.items():
-            if num != self.current_shape:
-                shape.set_edgecolor('gray')
-            else:
-                shape.set_edgecolor('r')
         self.row2 = widgets.HBox([self.shape_type_dn, self.shape_btn, self.clr_btn,
                                   self.shape_drn]+self._create_spin_boxes(size, angle))
         self.children = [self.row1, self.row2]
 
+    def _highlight_shape(self, num):
+        """Make a shape the current one and draw it red, the others gray."""
+        # Only the previously selected shape is red, so just recolour that
+        previous = self.parent.shapes.get(self.current_shape)
+        if previous is not None:
+            previous.set_edgecolor('gray')
+        self.parent.shapes[num].set_edgecolor('r')
+        self.current_shape = num
+
     def _move_quadrants(self, _pos):
         """Shift a quadrant."""
         offset = (self.posx_sel.value, self.posy_sel.value)
         self.parent.geom.set_quad_offset(self.parent.quad, offset)
-        self.parent.draw_quad_bound(self.parent.quad)
-        self.parent.update_plot(None)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (outside of Jupyter), redraw straight away
+            self._redraw_quadrants()
+            return
+        # Steps arriving in quick succession (e.g. holding an arrow key)
+        # only trigger one reassembly once they stop
+        if self._pending_redraw is not None:
+            self._pending_redraw.cancel()
+        self._pending_redraw = loop.call_later(self.redraw_delay,
+                                               self._redraw_quadrants)
+
+    def _redraw_quadrants(self):
+        """Show the moved quadrants."""
+        self._pending_redraw = None
+        if self.parent.quad is None:
+            self.parent.update_plot(None)
+        else:
+            # This also redraws the image
+            self.parent.draw_quad_bound(self.parent.quad)
 
     def _update_navi(self, pos):
         """Add navigation buttons."""
@@ -205,14 +222,14 @@ class ShapeTab(widgets.VBox):
                                               max=1000,
                                               step=1,
                                               disabled=False,
-                                              continuous_update=True,
+                                              continuous_update=False,
                                               description='Horz.')
             posy_sel = widgets.BoundedIntText(value=quad_offset[1],
                                               min=-1000,
                                               max=1000,
                                               step=1,
                                               disabled=False,
-                                              continuous_update=True,
+                                              continuous_update=False,
                                               description='Vert.')
             posx_sel.observe(self._move_quadrants, names='value')
             posy_sel.observe(self._move_quadrants, names='value')
@@ -229,12 +246,8 @@ class ShapeTab(widgets.VBox):
             pos = int(prop['new'])
         except ValueError:
             pos = 0
-        try:
-            self.parent.rect.remove()
-        except (AttributeError, ValueError):
-            pass
-
         if pos == 0:
+            self.parent.draw_quad_bound(None)
             self._update_navi(None)
             self.parent.quad = None
             return
@@ -258,6 +271,12 @@ class MaterialTab(widgets.VBox):
         self.alpha = 0.5  # The transparency value of the overlay
         self.clim = (0.5, 0.9)  # Standard clim (max alwys 1)
         self.img = None  # Image to be overlayed
+        # Last calculated overlay, keyed on everything it depends on
+        self._overlay = (None, None)
+        self._overlay_future = None  # Overlay still being calculated
+        # Missing data and values below the limits are see-through
+        self.cmap = colormaps['Reds'].with_extremes(bad=(1, 1, 1, 0),
+                                                     under=(1, 1, 1, 0))
         energy = 10e3  # [eV] Photon energy, default value can be overwirtten
         # Convert the energy to wave-length
         self.wave_length = self._energy2lambda(energy)
@@ -303,6 +322,7 @@ class MaterialTab(widgets.VBox):
             max=1,
             step=0.01,
             description='Transparancy:',
+            continuous_update=False,
             orientation='horizontal',
             readout=True,
             readout_format='.2f',
@@ -339,7 +359,7 @@ class MaterialTab(widgets.VBox):
     @staticmethod
     def _energy2lambda(energy):
         """Calc. wavelength from beam energy."""
-        return constants.h * constants.c / (energy * constants.eV)
+        return HC_OVER_EV / energy
 
     def _set_cdist(self, prop):
         """Set the detector probe distance."""
@@ -370,6 +390,26 @@ class MaterialTab(widgets.VBox):
         if isinstance(calib, str):
             self.calibrant = calib
 
+    @staticmethod
+    def _calibration_image(cal, shape, centre, cdist, pxsize, aspect):
+        """Calculate the ring pattern of a calibrant with pyFAI.
+
+        This runs in a worker thread, so it only uses its arguments and
+        doesn't read settings that can change in the meantime.
+        """
+        det = pyFAI.detectors.Detector(pxsize * aspect, pxsize)
+        det.shape = shape
+        det.max_shape = det.shape
+        cx, cy = centre
+        ai = AzimuthalIntegrator(dist=cdist,
+                                 poni1=cx*pxsize*aspect,
+                                 poni2=cy*pxsize,
+                                 wavelength=cal.wavelength,
+                                 detector=det)
+        # Single precision is plenty for display and halves the memory of
+        # the cached pattern and of matplotlib's copy
+        return cal.fake_calibration_image(ai).astype(np.float32)
+
     def _draw_overlay(self, *args):
         """Draw the ring structure with pyFAI."""
         if self.calibrant == 'None':
@@ -381,24 +421,55 @@ class MaterialTab(widgets.VBox):
             cal_file = os.path.join(celldir, self.calibrant+'.D')
             cal = pyFAI.calibrant.Calibrant(cal_file,
                                             wavelength=self.wave_length)
-        data, centre = self.parent.geom.position_all_modules(self.parent.raw_data,
-                                                             canvas=self.parent.canvas.shape)
-        det = pyFAI.detectors.Detector(self.pxsize * self.parent.aspect,
-                                       self.pxsize)
-        det.shape = data.shape
-        det.max_shape = det.shape
-        cx, cy = centre
-        ai = AzimuthalIntegrator(dist=self.cdist,
-                                 poni1=cx*self.pxsize*self.parent.aspect,
-                                 poni2=cy*self.pxsize,
-                                 wavelength=self.wave_length,
-                                 detector=det)
-        img = cal.fake_calibration_image(ai)
-        cmp = cm.Reds
-        cmp.set_bad('w', alpha=0)
-        cmp.set_under('w', alpha=0)
+        data, centre = self.parent.assemble()
+        # Everything the pattern depends on, read once now: the settings can
+        # change before a calculation waiting for the worker thread starts
+        args = (cal, data.shape, tuple(centre), self.cdist, self.pxsize,
+                self.parent.aspect)
+        key = (self.calibrant, self.wave_length) + args[1:]
+        self._cancel_overlay()
+        if self._overlay[0] == key:
+            # Nothing changed since the last overlay, just show it again
+            self._show_overlay(self._overlay[1])
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (outside of Jupyter), calculate straight away
+            self._overlay = (key, self._calibration_image(*args))
+            self._show_overlay(self._overlay[1])
+            return
+
+        # Calculate the pattern in the background to keep the widgets
+        # responsive; the result is shown from the event loop
+        def show(future):
+            if future.cancelled():
+                return
+            self._overlay_future = None
+            if future.exception() is not None:
+                # Raised in the event loop, where nobody would see it
+                log.error('Calculating the %s rings failed: %s', key[0],
+                          future.exception())
+                return
+            self._overlay = (key, future.result())
+            self._show_overlay(self._overlay[1])
+            # Outside of a widget callback, so ask for the redraw
+            self.parent.fig.canvas.draw_idle()
+
+        self._overlay_future = loop.run_in_executor(
+            _overlay_pool, self._calibration_image, *args)
+        self._overlay_future.add_done_callback(show)
+
+    def _cancel_overlay(self):
+        """Drop an overlay that is still being calculated."""
+        if self._overlay_future is not None:
+            self._overlay_future.cancel()
+            self._overlay_future = None
+
+    def _show_overlay(self, img):
+        """Display a calculated ring pattern on top of the image."""
         if self.img is None:
-            self.img = self.parent.ax.imshow(img, cmap=cmp,
+            self.img = self.parent.ax.imshow(img, cmap=self.cmap,
                                              alpha=1-self.alpha,
                                              vmin=self.clim[0],
                                              vmax=self.clim[1],
@@ -412,11 +483,9 @@ class MaterialTab(widgets.VBox):
 
     def _clear_overlay(self, *args):
         """Do not display the ring structure."""
+        self._cancel_overlay()
         if self.img is None:
             return
-        cmp = copy(cm.get_cmap('Reds'))
-        cmp.set_bad('w', alpha=0)
-        cmp.set_under('w', alpha=0)
         self.img.set_visible(False)
 
     def _set_alpha(self, prop):
@@ -1,5 +1,9 @@
+from contextlib import suppress
+from functools import lru_cache
+import json
 import os
 from pathlib import Path
+import re
 
 NB_MESSAGE = """Notebook has been created. You can use it by loading the file
 {nb_path} either by using JupyterHub on desy:
@@ -14,24 +18,44 @@ https://in.xfel.eu/readthedocs/docs/data-analysis-user-documentation/en/latest/c
 Note 1: the PORT_NUMBER should be a number of >= 1024 like 8432
 """
 
-NB_DIR = os.path.join(os.environ['HOME'], 'notebooks')
+NB_DIR = os.path.join(os.path.expanduser('~'), 'notebooks')
 NB_FILE = 'GeoAssembler.ipynb'
 CLEN = 0.119  # Default sample distance
 ENERGY = 10235  # Default beam energy
 # Default run directory
 RUNDIR = '/gpfs/exfel/exp/XMPL/201750/p700000/proc/r0005'
+TEMPLATE_PATH = Path(__file__).parent / 'templates' / 'geoAssembler.tmpl'
+
+
+@lru_cache(maxsize=4)
+def _load_template(path: Path):
+    """Read a notebook template, each template is only read once."""
+    return path.read_text('utf-8')
 
 
 def fill_notebook_template(nb_vars, dest_path: Path):
     """Fill the notebook template and write it to the destination path"""
-    tmpl = Path(__file__).parent / 'templates' / 'geoAssembler.tmpl'
-    contents = tmpl.read_text('utf-8')
+    contents = _load_template(TEMPLATE_PATH)
 
-    for key, value in nb_vars.items():
-        contents = contents.replace('{%s}' % key, repr(value))
+    # The placeholders are inside JSON strings holding Python code: insert
+    # the Python literal, escaped for JSON (without the enclosing quotes)
+    literals = {key: json.dumps(repr(value))[1:-1]
+                for key, value in nb_vars.items()}
+    # Substitute all {key} placeholders in a single pass over the template
+    placeholder = re.compile('{(%s)}' % '|'.join(map(re.escape, nb_vars)))
+    contents = placeholder.sub(lambda m: literals[m.group(1)], contents)
 
     dest_path.parent.mkdir(parents=True, exist_ok=True)
-    dest_path.write_text(contents, 'utf-8')
+    # Write a temporary file next to the destination and move it in place,
+    # so an existing notebook is never left half written
+    tmp_path = dest_path.with_name(dest_path.name + '.tmp')
+    try:
+        tmp_path.write_bytes(contents.encode('utf-8'))
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            tmp_path.unlink()
+        raise
 
     print(NB_MESSAGE.format(nb_path=dest_path))
 
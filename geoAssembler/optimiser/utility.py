@@ -42,6 +42,11 @@ class Integrator:
             poni1=self.centre[0] * geom.pixel_size,
             poni2=self.centre[1] * geom.pixel_size,
         )
+        #  Every change of the geometry (e.g. a centre offset) makes pyFAI
+        #  run the garbage collector, which takes about as long as the
+        #  integration itself. The setting is kept by the copies we integrate
+        #  with, older pyFAI versions just ignore it
+        ai.auto_gc = False
         self.ai = ai
 
         self.radius = round(
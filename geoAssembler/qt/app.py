@@ -214,9 +214,11 @@ class QtMainWidget(QtGui.QMainWindow):
             return
         inc = np.array(Defaults.direction[d])*np.array([self._flip_lr, 1])
         self.geom_obj.move_quad(quad, inc)
+        # Reassemble into the current image, the gaps are reset to nan
         self.data, self.centre =\
             self.geom_obj.position_all_modules(self.raw_data,
-                                               canvas=self.canvas_shape)
+                                               canvas=self.canvas_shape,
+                                               out=self.data)
         self._draw_rect(quad)
         self.redraw_image()
 
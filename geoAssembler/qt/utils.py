@@ -1,11 +1,13 @@
+from functools import lru_cache
 import os.path as osp
 from pyqtgraph.Qt import (QtCore, QtGui)
 
+ICON_DIR = osp.join(osp.dirname(osp.dirname(__file__)), 'icons')
+
+@lru_cache(maxsize=None)
 def get_icon(file_name):
-    """Load icon from file."""
-    pkg_dir = osp.dirname(osp.dirname(__file__))
-    icon_path = osp.join(pkg_dir, 'icons')
-    icon = QtGui.QIcon(osp.join(icon_path, file_name))
+    """Load icon from file, each file is only loaded once."""
+    icon = QtGui.QIcon(osp.join(ICON_DIR, file_name))
     return icon
 
 
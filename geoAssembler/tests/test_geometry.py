@@ -1,6 +1,10 @@
+from extra_geom import DSSC_1MGeometry, LPD_1MGeometry
 import numpy as np
+import pytest
 
-from ..geometry import AGIPDGeometry
+from .. import _assemble_numba
+from ..defaults import DefaultGeometryConfig as Defaults
+from ..geometry import AGIPDGeometry, DSSCGeometry, LPDGeometry
 
 def test_snap_assemble_data():
     """Tes the crude assembly with quadrant positions."""
@@ -97,3 +101,172 @@ def get_quad_corners():
     assert width == 530
     assert height == 603
 
+
+@pytest.mark.parametrize('geom_cls, exgeom_cls', [
+    (DSSCGeometry, DSSC_1MGeometry),
+    (LPDGeometry, LPD_1MGeometry),
+])
+def test_quad_pos_h5(tmpdir, geom_cls, exgeom_cls):
+    """Get quadrant positions relative to an XFEL HDF5 geometry file."""
+    quad_pos = Defaults.fallback_quad_pos[geom_cls.detector_name]
+    path = str(tmpdir / 'geom.h5')
+    exgeom_cls.from_quad_positions(quad_pos).to_h5_file_and_quad_positions(path)
+
+    geom = geom_cls.from_h5_file_and_quad_positions(path, quad_pos)
+    np.testing.assert_allclose(geom.quad_pos.values, quad_pos)
+
+    geom.move_quad(2, np.array((3, -1)))
+    np.testing.assert_allclose(geom.quad_pos.values,
+                               geom.exgeom_obj.quad_positions(path))
+
+def test_quad_pos_cache():
+    """Quadrant positions are updated after moving a quadrant."""
+    geom = AGIPDGeometry.from_quad_positions(quad_pos=[
+        (-525, 625),
+        (-550, -10),
+        (520, -160),
+        (542.5, 475),
+    ])
+    before = geom.quad_pos
+    # Modifying the returned frame must not alter the cached positions
+    before.loc['q1', 'X'] += 100
+    assert geom.quad_pos.loc['q1', 'X'] == before.loc['q1', 'X'] - 100
+
+    geom.move_quad(1, np.array((1, 0)))
+    assert geom.quad_pos.loc['q1', 'X'] == before.loc['q1', 'X'] - 99
+    assert geom.quad_pos.loc['q2', 'X'] == before.loc['q2', 'X']
+
+def test_assemble_fill():
+    """Choose the value of pixels not covered by the detector."""
+    geom = AGIPDGeometry.from_quad_positions(quad_pos=[
+        (-525, 625),
+        (-550, -10),
+        (520, -160),
+        (542.5, 475),
+    ])
+    stacked_data = np.ones((16, 512, 128))
+    img, centre = geom.position_all_modules(stacked_data, fill=-1)
+    assert img.shape == (1256, 1092)
+    assert tuple(centre) == (631, 550)
+    assert img[0, 0] == -1
+    assert img[50, 50] == 1
+
+    img, centre = geom.position_all_modules(stacked_data, canvas=(1500, 1400),
+                                            fill=None)
+    assert img.shape == (1500, 1400)
+    assert centre == (750, 700)
+    # Pixel (50, 50) of the uncropped image, shifted to the canvas centre
+    assert img[50 + 750 - 631, 50 + 700 - 550] == 1
+
+    # Integer data can't hold the default nan, but any other integer fill
+    int_data = stacked_data.astype(np.uint16)
+    img, _ = geom.position_all_modules(int_data, canvas=(1500, 1400))
+    assert img[0, 0] == 0
+    img, _ = geom.position_all_modules(int_data, canvas=(1500, 1400),
+                                       fill=65535)
+    assert img.dtype == np.uint16
+    assert img[0, 0] == 65535
+    img[:] = 7
+    geom.position_all_modules(int_data, canvas=(1500, 1400), fill=3, out=img)
+    assert img[0, 0] == 3
+    assert img[50 + 750 - 631, 50 + 700 - 550] == 1
+    with pytest.raises(ValueError):
+        geom.position_all_modules(int_data, canvas=(1500, 1400), fill=-1)
+    with pytest.raises(ValueError):
+        geom.position_all_modules(int_data, fill=0.5)
+
+def test_assemble_out():
+    """Assemble data into an existing array."""
+    geom = AGIPDGeometry.from_quad_positions(quad_pos=[
+        (-525, 625),
+        (-550, -10),
+        (520, -160),
+        (542.5, 475),
+    ])
+    stacked_data = np.zeros((16, 512, 128))
+    out = geom.make_output_array(stacked_data.shape)
+    img, centre = geom.position_all_modules(stacked_data, out=out)
+    assert img is out
+    assert tuple(centre) == (631, 550)
+    assert np.isnan(img[0, 0])
+    assert img[50, 50] == 0
+
+    canvas = (1500, 1400)
+    out = geom.make_output_array(stacked_data.shape, canvas=canvas)
+    img, centre = geom.position_all_modules(stacked_data, canvas, out=out)
+    assert img is out
+    assert centre == (750, 700)
+
+    # Pixels uncovered by moving a quadrant are reset to nan
+    geom.move_quad(1, np.array((0, 20)))
+    expected, _ = geom.position_all_modules(stacked_data, canvas)
+    geom.position_all_modules(stacked_data, canvas, out=img)
+    np.testing.assert_array_equal(img, expected)
+
+    with pytest.raises(ValueError):
+        geom.position_all_modules(stacked_data, out=out)
+
+@pytest.mark.parametrize('geom_cls', [AGIPDGeometry, DSSCGeometry, LPDGeometry])
+def test_assemble_canvas(geom_cls):
+    """Embed the assembled data in a canvas."""
+    geom = geom_cls.from_quad_positions(
+        Defaults.fallback_quad_pos[geom_cls.detector_name]
+    )
+    geom.move_quad(2, np.array((3, -5)))
+    shape = geom.exgeom_obj.expected_data_shape
+    stacked_data = np.random.default_rng(0).random(shape).astype(np.float32)
+    canvas = tuple(np.array(geom.snapped_geom.size_yx) + 300)
+
+    img, centre = geom.position_all_modules(stacked_data, canvas=canvas)
+    assert img.dtype == np.float32
+    assert centre == (canvas[0]//2, canvas[1]//2)
+    expected = geom.exgeom_obj.position_modules_symmetric(
+        stacked_data, out=np.full(canvas, np.nan, dtype=np.float32)
+    )
+    np.testing.assert_array_equal(img, expected)
+
+    with pytest.raises(ValueError):
+        geom.position_all_modules(stacked_data, canvas=(100, 100))
+
+
+@pytest.mark.parametrize('geom_cls', [AGIPDGeometry, DSSCGeometry, LPDGeometry])
+def test_assemble_numba(geom_cls, monkeypatch):
+    """The numba kernel assembles like the numpy slices."""
+    pytest.importorskip('numba')
+    geom = geom_cls.from_quad_positions(
+        Defaults.fallback_quad_pos[geom_cls.detector_name]
+    )
+    geom.move_quad(2, np.array((3, -5)))
+    shape = (2,) + geom.exgeom_obj.expected_data_shape
+    stacked_data = np.random.default_rng(0).random(shape).astype(np.float32)
+    canvas = tuple(np.array(geom.snapped_geom.size_yx) + 300)
+
+    assert _assemble_numba.HAVE_NUMBA
+    img, _ = geom.position_all_modules(stacked_data, canvas=canvas)
+    monkeypatch.setattr(_assemble_numba, 'HAVE_NUMBA', False)
+    expected, _ = geom.position_all_modules(stacked_data, canvas=canvas)
+    np.testing.assert_array_equal(img, expected)
+
+
+@pytest.mark.parametrize('geom_cls', [AGIPDGeometry, DSSCGeometry, LPDGeometry])
+def test_assemble_cupy(geom_cls):
+    """Assembling on the GPU gives the same image as on the CPU."""
+    cp = pytest.importorskip('cupy')
+    geom = geom_cls.from_quad_positions(
+        Defaults.fallback_quad_pos[geom_cls.detector_name]
+    )
+    geom.move_quad(2, np.array((3, -5)))
+    shape = (2,) + geom.exgeom_obj.expected_data_shape
+    stacked_data = np.random.default_rng(0).random(shape).astype(np.float32)
+    canvas = tuple(np.array(geom.snapped_geom.size_yx) + 300)
+
+    expected, centre = geom.position_all_modules(stacked_data, canvas=canvas)
+    img, gpu_centre = geom.position_all_modules_cupy(cp.asarray(stacked_data),
+                                                     canvas)
+    np.testing.assert_array_equal(cp.asnumpy(img), expected)
+    assert gpu_centre == centre
+
+    # Reusing the output array resets the gaps
+    img.fill(1)
+    geom.position_all_modules_cupy(cp.asarray(stacked_data), canvas, out=img)
+    np.testing.assert_array_equal(cp.asnumpy(img), expected)
@@ -1,6 +1,26 @@
+import json
+import subprocess
+import sys
+
 from geoAssembler.main import main
+from geoAssembler.nb import create_nb
 from testpath import assert_isfile
 
 def test_template_notebook(tmp_path):
     main(['--notebook', '--nb_dir', str(tmp_path)])
     assert_isfile(tmp_path / 'GeoAssembler.ipynb')
+
+def test_template_notebook_quoting(tmp_path):
+    rundir = 'C:\\data\\"r0005"'
+    create_nb(rundir=rundir, dest_path=tmp_path / 'nb.ipynb')
+    with open(tmp_path / 'nb.ipynb') as f:
+        nb = json.load(f)
+    source = ''.join(line for cell in nb['cells'] for line in cell['source'])
+    assert 'run_dir = {!r} '.format(rundir) in source
+    assert 'geofile = None ' in source
+
+def test_calibrants_list():
+    # The submodule being imported first mustn't shadow the calibrant list
+    code = ('import geoAssembler.nb.tabs; from geoAssembler import calibrants;'
+            'assert isinstance(calibrants, list), calibrants')
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -1,9 +1,14 @@
+import asyncio
+import threading
+from unittest import mock
+
 from extra_data import RunDirectory, stack_detector_data
 import ipywidgets
 import pytest
 
 from geoAssembler import CalibrateNb
 from geoAssembler.nb.notebook import CircleShape, SquareShape
+from geoAssembler.nb import tabs
 from geoAssembler.nb.tabs import ShapeTab
 
 @pytest.fixture(scope='session')
@@ -21,6 +26,13 @@ def test_create_widgets(agipd_frame):
     assert isinstance(calib.val_slider, ipywidgets.FloatRangeSlider)
     assert isinstance(calib.cmap_sel, ipywidgets.Dropdown)
 
+def test_set_clim(agipd_frame):
+    calib = CalibrateNb(agipd_frame, det='AGIPD', vmin=0, vmax=1000)
+
+    calib.val_slider.value = [100, 500]
+    assert calib.im.get_clim() == (100, 500)
+    assert calib.cbar.get_ticks()[[0, -1]].tolist() == [100, 500]
+
 def test_add_shapes(agipd_frame):
     calib = CalibrateNb(agipd_frame, det='AGIPD')
     assert len(calib.shapes) == 0
@@ -57,3 +69,104 @@ def test_move_quad(agipd_frame):
 
     print("after:", calib.quad_pos.loc['q1'])
     assert tuple(calib.quad_pos.loc['q1']) == (q1_x_initial + dh, q1_y_initial + dv)
+
+def test_move_quad_coalesced(agipd_frame):
+    calib = CalibrateNb(agipd_frame, det='AGIPD')
+    shape_tab = calib.tabs.children[0]
+    shape_tab.selection.value = '1'
+    horz_widg = shape_tab.buttons[2]
+    q1_x_initial, q1_y_initial = calib.quad_pos.loc['q1']
+
+    async def nudge():
+        for _ in range(5):
+            horz_widg.value += 1
+        await asyncio.sleep(2 * shape_tab.redraw_delay)
+
+    with mock.patch.object(calib, 'update_plot') as update_plot:
+        asyncio.run(nudge())
+
+    # With an event loop the plot is only redrawn after the last step
+    update_plot.assert_called_once()
+    assert tuple(calib.quad_pos.loc['q1']) == (q1_x_initial + 5, q1_y_initial)
+
+def test_resize_shape(agipd_frame):
+    calib = CalibrateNb(agipd_frame, det='AGIPD')
+    shape_tab = calib.tabs.children[0]
+    shape_tab.shape_btn.click()
+    shape_tab.shape_btn.click()
+    shape_tab.shape_drn.value = shape_tab.shape_drn.options[0]
+    shape_drn = shape_tab.shape_drn
+    size_widg = shape_tab.row2.children[4]
+
+    size_widg.value = 200
+
+    # The selection is relabelled in place and stays on the resized shape
+    assert shape_tab.shape_drn is shape_drn
+    assert shape_drn.value == '0:Circle(200)'
+    assert shape_tab.current_shape == 0
+    assert calib.shapes[0].get_size() == 200
+
+def test_overlay_background(agipd_frame):
+    calib = CalibrateNb(agipd_frame, det='AGIPD')
+    material_tab = calib.tabs.children[1]
+    material_tab.calib_btn.value = 'LaB6'
+
+    async def apply():
+        material_tab.aply_btn.click()
+        # With an event loop the rings are calculated in the background
+        assert material_tab.img is None
+        await material_tab._overlay_future
+
+    asyncio.run(apply())
+    assert material_tab.img.get_visible()
+    assert material_tab.img.get_array().shape == calib.data.shape
+
+def test_overlay_settings_snapshot(agipd_frame):
+    calib = CalibrateNb(agipd_frame, det='AGIPD')
+    material_tab = calib.tabs.children[1]
+    material_tab.calib_btn.value = 'LaB6'
+    material_tab.dist_btn.value = 0.3
+    used = []
+
+    class Integrator(tabs.AzimuthalIntegrator):
+        def __init__(self, dist, **kwargs):
+            used.append(dist)
+            super().__init__(dist=dist, **kwargs)
+
+    async def apply():
+        # Keep the worker thread busy, so the calculation has to wait
+        release = threading.Event()
+        busy = asyncio.get_running_loop().run_in_executor(
+            tabs._overlay_pool, release.wait)
+        material_tab.aply_btn.click()
+        material_tab.dist_btn.value = 0.4
+        release.set()
+        await busy
+        await material_tab._overlay_future
+
+    with mock.patch.object(tabs, 'AzimuthalIntegrator', Integrator):
+        asyncio.run(apply())
+    # The rings are calculated with the distance at the time of the click
+    assert used == [0.3]
+    assert 0.3 in material_tab._overlay[0]
+
+def test_overlay_error(agipd_frame, caplog):
+    calib = CalibrateNb(agipd_frame, det='AGIPD')
+    material_tab = calib.tabs.children[1]
+    material_tab.calib_btn.value = 'LaB6'
+
+    async def apply():
+        material_tab.aply_btn.click()
+        future = material_tab._overlay_future
+        with pytest.raises(ValueError):
+            await future
+        await asyncio.sleep(0)
+
+    with mock.patch.object(tabs, 'AzimuthalIntegrator',
+                           side_effect=ValueError('bad geometry')):
+        asyncio.run(apply())
+    # Reported by the tab, not just as an unhandled error in the event loop
+    assert [r.getMessage() for r in caplog.records if r.name == tabs.log.name] \
+        == ['Calculating the LaB6 rings failed: bad geometry']
+    assert material_tab._overlay_future is None
+    assert material_tab.img is None
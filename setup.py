@@ -73,9 +73,17 @@ setup(name="geoAssembler",
           'test': [
               'pytest',
               'testpath',
-          ]
+          ],
+          # Compiled, multi-threaded assembly onto a canvas
+          'numba': [
+              'numba',
+          ],
+          # Assembling data held on the GPU
+          'cupy': [
+              'cupy',
+          ],
       },
-      python_requires='>=3.4',
+      python_requires='>=3.7',
       classifiers=[
           'Development Status :: 3 - Alpha',
           'Environment :: Console',